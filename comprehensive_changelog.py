@@ -6,9 +6,15 @@
 
 import os
 import re
+import json
 import requests
 import logging
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from operator import itemgetter
 from typing import List, Dict, Optional
+from urllib.parse import parse_qs, urlparse
 
 # 设置日志
 logging.basicConfig(
@@ -20,6 +26,44 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# 正式版标签，分组依次为主/次/修订版本号
+_FORMAL_TAG_RE = re.compile(r'^v(\d+)\.(\d+)\.(\d+)$')
+# 移除 CDK 链接及其后的固定结尾
+_CDK_MARKER = '\n[已有 Mirror酱 CDK'
+
+# 构建信息的末尾：从换行起 10 个字符全是空白（不足 10 个时直到文末），或紧跟 ## 标题
+_BUILD_INFO_END_RE = re.compile(r'\n(?:\s{9}|\s{0,8}\Z|##)')
+
+# releases 分页的 ETag 缓存文件（与 current_changelog.md 同在工作目录）
+_ETAG_CACHE_FILE = '.changelog_etag_cache.json'
+
+# 只请求生成历史区块需要的字段，按创建时间倒序分页
+_RELEASES_QUERY = """
+query($owner: String!, $name: String!, $cursor: String) {
+  repository(owner: $owner, name: $name) {
+    releases(first: 100, after: $cursor, orderBy: {field: CREATED_AT, direction: DESC}) {
+      nodes { tagName isPrerelease publishedAt description }
+      pageInfo { hasNextPage endCursor }
+    }
+  }
+}
+"""
+
+# REST 接口返回的 release 中实际用到的字段
+_RELEASE_FIELDS = ('tag_name', 'body', 'published_at', 'created_at', 'prerelease', 'name')
+
+
+def _slim_release(obj: Dict) -> Dict:
+    """json 解码钩子：只保留需要的字段，丢弃 assets/author 等大对象"""
+    return {k: obj[k] for k in _RELEASE_FIELDS if k in obj}
+
+
+@lru_cache(maxsize=None)
+def _parse_formal_tag(tag: str) -> Optional[tuple]:
+    """解析正式版标签为 (主, 次, 修订) 元组，非正式版返回 None（按标签缓存）"""
+    match = _FORMAL_TAG_RE.match(tag)
+    return tuple(int(n) for n in match.groups()) if match else None
+
 class ChangelogGenerator:
     def __init__(self, current_tag: str, github_token: str, repo_owner: str, repo_name: str):
         self.current_tag = current_tag
@@ -32,43 +76,140 @@ class ChangelogGenerator:
             "Accept": "application/vnd.github.v3+json",
             "User-Agent": "MFABD2-Changelog-Generator"
         }
+        # 所有 API 请求共用一个会话，复用 keep-alive 连接，避免每次重新握手
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        self.session.mount("https://", HTTPAdapter(pool_connections=10, pool_maxsize=10))
+    
+    def load_etag_cache(self) -> Dict:
+        """读取 releases 分页的 ETag 缓存"""
+        try:
+            with open(_ETAG_CACHE_FILE, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
     
-    def get_all_releases(self) -> List[Dict]:
-        """获取所有 releases"""
+    def save_etag_cache(self, cache: Dict):
+        """保存 releases 分页的 ETag 缓存"""
+        try:
+            with open(_ETAG_CACHE_FILE, 'w', encoding='utf-8') as f:
+                json.dump(cache, f, ensure_ascii=False)
+        except OSError as e:
+            logger.warning(f"保存 ETag 缓存失败: {e}")
+    
+    def get_all_releases(self, minor_version: Optional[str] = None) -> List[Dict]:
+        """获取所有 releases（首页探测总页数，其余页面并发获取；给定次版本时取到更早版本即停止）"""
         logger.info("获取所有 releases...")
         url = f"{self.base_url}/releases"
-        releases = []
-        page = 1
+        cache = self.load_etag_cache()
+        target = tuple(int(n) for n in minor_version.split('.')) if minor_version else None
+        
+        def reached_older(page_releases: List[Dict]) -> bool:
+            """该页是否已出现比目标次版本更早的正式版"""
+            if target is None:
+                return False
+            return any((version := _parse_formal_tag(release['tag_name'])) and version[:2] < target
+                       for release in page_releases)
         
-        while True:
-            response = requests.get(f"{url}?page={page}&per_page=100", headers=self.headers)
+        def fetch_page(page: int) -> tuple:
+            """返回 (响应, 该页 releases, 末页链接)；未变化的页面由缓存提供"""
+            key = f"{url}?page={page}"
+            cached = cache.get(key)
+            # 条件请求：内容未变化时返回 304，不传输正文也不消耗速率限制
+            headers = {"If-None-Match": cached["etag"]} if cached else {}
+            response = self.session.get(url, params={"page": page, "per_page": 100}, headers=headers)
+            last_url = response.links.get("last", {}).get("url", "")
+            if response.status_code == 304:
+                return response, cached["releases"], last_url or cached["last"]
             if response.status_code != 200:
-                logger.error(f"获取 releases 失败: {response.status_code} - {response.text}")
-                break
+                return response, None, ""
+            page_releases = response.json(object_hook=_slim_release)
+            if response.headers.get("ETag"):
+                cache[key] = {"etag": response.headers["ETag"], "releases": page_releases, "last": last_url}
+            return response, page_releases, last_url
+        
+        response, first_page, last_url = fetch_page(1)
+        if first_page is None:
+            logger.error(f"获取 releases 失败: {response.status_code} - {response.text}")
+            return []
+        # 复制一份再追加后续页面，避免改动缓存中的首页内容
+        releases = list(first_page)
+        
+        # 通过 Link 头中的 rel="last" 得知总页数
+        last_page = int(parse_qs(urlparse(last_url).query).get("page", ["1"])[0])
+        
+        # 安全限制，最多获取10页
+        if last_page > 10:
+            logger.warning("达到页面限制，停止获取更多 releases")
+            last_page = 10
+        
+        # releases 按创建时间倒序，首页已出现更早的次版本时无需再取后续页面
+        if last_page > 1 and reached_older(first_page):
+            logger.info("首页已包含目标次版本的全部 releases，跳过后续页面")
+        elif last_page > 1:
+            with ThreadPoolExecutor(max_workers=min(last_page - 1, 8)) as executor:
+                # map 保持页码顺序，遇到第一个失败页或更早的次版本即停止，并取消尚未开始的请求
+                for response, page_releases, _ in executor.map(fetch_page, range(2, last_page + 1)):
+                    if page_releases is None:
+                        logger.error(f"获取 releases 失败: {response.status_code} - {response.text}")
+                        executor.shutdown(cancel_futures=True)
+                        break
+                    releases.extend(page_releases)
+                    if reached_older(page_releases):
+                        executor.shutdown(cancel_futures=True)
+                        break
+        
+        self.save_etag_cache(cache)
+        logger.info(f"共获取 {len(releases)} 个 releases")
+        return releases
+    
+    def get_releases_graphql(self, minor_version: str) -> Optional[List[Dict]]:
+        """通过 GraphQL 获取 releases，只传输需要的字段；失败时返回 None"""
+        logger.info("通过 GraphQL 获取 releases...")
+        target = tuple(int(n) for n in minor_version.split('.'))
+        variables = {"owner": self.repo_owner, "name": self.repo_name, "cursor": None}
+        releases = []
+        
+        for _ in range(10):  # 安全限制，最多获取10页
+            response = self.session.post("https://api.github.com/graphql",
+                                         json={"query": _RELEASES_QUERY, "variables": variables})
+            data = response.json() if response.status_code == 200 else {}
+            if not data.get("data") or data.get("errors"):
+                logger.warning(f"GraphQL 查询失败: {response.status_code} - {response.text}")
+                return None
             
-            page_releases = response.json()
-            if not page_releases:
-                break
-                
-            releases.extend(page_releases)
-            page += 1
+            connection = data["data"]["repository"]["releases"]
+            reached_older = False
+            for node in connection["nodes"]:
+                # 转换为 REST 接口的字段名，后续过滤逻辑无需区分来源
+                releases.append({
+                    'tag_name': node['tagName'],
+                    'prerelease': node['isPrerelease'],
+                    'published_at': node['publishedAt'],
+                    'body': node['description'],
+                })
+                version = _parse_formal_tag(node['tagName'])
+                if version and version[:2] < target:
+                    reached_older = True
             
-            # 安全限制，最多获取10页
-            if page > 10:
-                logger.warning("达到页面限制，停止获取更多 releases")
+            # 按创建时间倒序，出现更早的次版本后说明目标次版本已全部取到
+            if reached_older or not connection["pageInfo"]["hasNextPage"]:
                 break
+            variables["cursor"] = connection["pageInfo"]["endCursor"]
         
         logger.info(f"共获取 {len(releases)} 个 releases")
         return releases
     
-    def is_formal_release(self, tag: str) -> bool:
+    @staticmethod
+    def is_formal_release(tag: str) -> bool:
         """判断是否为正式版标签"""
-        return bool(re.match(r'^v\d+\.\d+\.\d+$', tag))
+        return _parse_formal_tag(tag) is not None
     
-    def extract_minor_version(self, tag: str) -> Optional[str]:
+    @staticmethod
+    def extract_minor_version(tag: str) -> Optional[str]:
         """从标签中提取次版本号"""
-        match = re.match(r'^v(\d+\.\d+)\.\d+$', tag)
-        return match.group(1) if match else None
+        version = _parse_formal_tag(tag)
+        return f"{version[0]}.{version[1]}" if version else None
     
     def extract_main_content(self, body: str) -> str:
         """提取主要内容（使用成功版本的逻辑）"""
@@ -84,10 +225,9 @@ class ChangelogGenerator:
             logger.info("使用标记截断内容")
             return clean_content
         
-        # 方法2：使用成功版本的正则表达式，移除固定结尾
-        pattern = r'^(.*?)(?=\n\[已有 Mirror酱 CDK|\n*$)'
-        match = re.search(pattern, body, re.DOTALL)
-        content = match.group(1).strip() if match else body
+        # 方法2：在固定结尾（Mirror酱 CDK 链接）处截断
+        cdk_pos = body.find(_CDK_MARKER)
+        content = (body[:cdk_pos] if cdk_pos != -1 else body).strip()
         
         logger.info("使用CDK链接截断内容")
         return content
@@ -103,29 +243,30 @@ class ChangelogGenerator:
         
         logger.info(f"查找次版本 {minor_version} 的所有正式版 Release...")
         
-        # 获取所有 Release
-        all_releases = self.get_all_releases()
+        # 获取 Release（优先 GraphQL，失败时回退到 REST 分页）
+        all_releases = self.get_releases_graphql(minor_version)
+        if all_releases is None:
+            all_releases = self.get_all_releases(minor_version)
         
-        # 过滤出同一次版本的正式版 Release
-        minor_releases = []
-        for release in all_releases:
-            tag = release['tag_name']
-            if (self.is_formal_release(tag) and 
-                self.extract_minor_version(tag) == minor_version and
-                not release.get('prerelease', False)):
-                minor_releases.append(release)
+        # 单次遍历：过滤出同一次版本的正式版 Release，并按预先解析的版本号排序（新版在上）
+        target = _parse_formal_tag(self.current_tag)[:2]
+        keyed_releases = sorted(
+            ((version, release) for release in all_releases
+             if (version := _parse_formal_tag(release['tag_name'])) and
+             version[:2] == target and
+             not release.get('prerelease', False)),
+            key=itemgetter(0), reverse=True)
         
-        if not minor_releases:
+        if not keyed_releases:
             logger.info(f"次版本 {minor_version} 没有正式版，无需合并历史")
             return ""
         
-        # 按版本号排序（新版在上）
-        minor_releases.sort(key=lambda x: [int(n) for n in x['tag_name'][1:].split('.')], reverse=True)
+        minor_releases = [release for _, release in keyed_releases]
         
         logger.info(f"找到 {len(minor_releases)} 个正式版: {[r['tag_name'] for r in minor_releases]}")
         
         # 构建历史内容
-        historical_content = ""
+        folded_blocks = []
         for release in minor_releases:
             tag = release['tag_name']
             body = release.get('body', '') or ""
@@ -143,10 +284,12 @@ class ChangelogGenerator:
 {main_content}
 
 </details>"""
-            historical_content += folded_block + "\n\n"
+            folded_blocks.append(folded_block)
             logger.info(f"为版本 {tag} 创建折叠块")
         
-        if historical_content:
+        if folded_blocks:
+            # 每个折叠块后跟一个空行，一次性拼接
+            historical_content = "".join(f"{block}\n\n" for block in folded_blocks)
             final_content = f"""## 历史版本更新内容
 
 {historical_content}"""
@@ -168,15 +311,8 @@ class ChangelogGenerator:
         
         if build_info_pos != -1:
             # 找到构建信息的末尾
-            insert_pos = current_content.find('\n', build_info_pos)
-            while insert_pos != -1 and insert_pos < len(current_content) - 1:
-                next_chars = current_content[insert_pos:insert_pos+10]
-                if next_chars.strip() == "" or next_chars.startswith('\n##'):
-                    break
-                insert_pos = current_content.find('\n', insert_pos + 1)
-            
-            if insert_pos == -1:
-                insert_pos = len(current_content)
+            match = _BUILD_INFO_END_RE.search(current_content, build_info_pos)
+            insert_pos = match.start() if match else len(current_content)
             
             logger.info(f"在构建信息后插入历史区块")
             return (current_content[:insert_pos] + 
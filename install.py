@@ -3,6 +3,10 @@ import shutil
 import sys
 import re
 import os
+import json
+import mmap
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
 
 try:
     import jsonc
@@ -20,107 +24,251 @@ working_dir = Path(__file__).parent
 install_path = working_dir / Path("install")
 version = len(sys.argv) > 1 and sys.argv[1] or "v0.0.1"
 
+# 并发转换换行符时每批提交的文件数
+_CONVERT_CHUNK_SIZE = 256
+
+# 超过该大小的文件用 mmap 检查换行符
+_MMAP_THRESHOLD = 64 * 1024
+# 不属于 CRLF 的单独 LF 或 CR
+_BARE_EOL_RE = re.compile(rb'(?<!\r)\n|\r(?!\n)')
+
+# interface.json 中 version / custom_title 的 JSON 字符串值（分组 1，含引号）
+_VERSION_VALUE_RE = re.compile(r'"version"\s*:\s*("(?:[^"\\]|\\.)*")')
+_TITLE_VALUE_RE = re.compile(r'"custom_title"\s*:\s*("(?:[^"\\]|\\.)*")')
+
+def _link_or_copy(src, dst, *, follow_symlinks=True):
+    """优先创建硬链接，不支持时退回 copy2"""
+    try:
+        if os.path.lexists(dst):
+            if os.path.samefile(src, dst):
+                return dst
+            os.unlink(dst)
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst, follow_symlinks=follow_symlinks)
+    return dst
+
+def _same_device(src, dst):
+    """dst（或其最近的已存在上级目录）是否与 src 位于同一文件系统"""
+    dst = Path(dst)
+    while not dst.exists():
+        dst = dst.parent
+    return os.stat(src).st_dev == os.stat(dst).st_dev
+
+def _fast_copytree(src, dst, ignore_globs=()):
+    """复制目录树：同一文件系统时硬链接，否则交给 robocopy / cp -a，均不可用时回退 copytree"""
+    if not _same_device(src, dst):
+        try:
+            if sys.platform == "win32":
+                args = ["robocopy", str(src), str(dst), "/E", "/NFL", "/NDL", "/NJH", "/NJS", "/MT:8"]
+                if ignore_globs:
+                    # ignore_patterns 同时作用于文件和目录
+                    args += ["/XF", *ignore_globs, "/XD", *ignore_globs]
+                # robocopy 返回值小于 8 均表示成功
+                if subprocess.run(args, stdout=subprocess.DEVNULL).returncode < 8:
+                    return
+            elif not ignore_globs:
+                # cp 无法排除文件，有排除规则时直接使用 copytree
+                os.makedirs(dst, exist_ok=True)
+                if subprocess.run(["cp", "-a", f"{src}/.", str(dst)]).returncode == 0:
+                    return
+        except OSError:
+            pass
+
+    shutil.copytree(
+        src,
+        dst,
+        ignore=shutil.ignore_patterns(*ignore_globs) if ignore_globs else None,
+        dirs_exist_ok=True,
+        copy_function=_link_or_copy,
+    )
+
 def install_deps():
     if not (working_dir / "deps" / "bin").exists():
         print("Please download the MaaFramework to \"deps\" first.")
         print("请先下载 MaaFramework 到 \"deps\"。")
         sys.exit(1)
 
-    shutil.copytree(
+    _fast_copytree(
         working_dir / "deps" / "bin",
         install_path,
-        ignore=shutil.ignore_patterns(
+        ignore_globs=(
             "*MaaDbgControlUnit*",
             "*MaaThriftControlUnit*",
             "*MaaRpc*",
             "*MaaHttp*",
         ),
-        dirs_exist_ok=True,
     )
-    shutil.copytree(
+    _fast_copytree(
         working_dir / "deps" / "share" / "MaaAgentBinary",
         install_path / "MaaAgentBinary",
-        dirs_exist_ok=True,
     )
 
-def convert_line_endings(file_path):
-    """将文件的换行符统一转换为 Windows 格式 (CRLF)"""
+def convert_line_endings(src_path, dst_path):
+    """复制文件并将换行符统一转换为 Windows 格式 (CRLF)"""
     try:
-        # 读取文件内容
-        with open(file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
+        # 以字节读取，换行符都是 ASCII，无需 UTF-8 解码；content 为 None 表示已是 CRLF
+        with open(src_path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size > _MMAP_THRESHOLD:
+                # 大文件映射到内存后直接查找单独的 CR / LF，已是 CRLF 时无需整个读入
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    content = mm[:] if _BARE_EOL_RE.search(mm) else None
+            else:
+                content = f.read()
+                # 每个 \r 和 \n 都属于某个 CRLF 时已是目标格式
+                if content.count(b'\r\n') * 2 == content.count(b'\r') + content.count(b'\n'):
+                    content = None
+        
+        # 已是目标格式，直接链接或复制
+        if content is None:
+            _link_or_copy(src_path, dst_path)
+            return True
         
-        # 统一转换为 CRLF
-        content = content.replace('\r\n', '\n')  # 先标准化为 LF
+        # 先把 CRLF 和单独的 CR 归一为 LF，再统一展开为 CRLF（bytes.replace 比正则替换快得多）
+        content = content.replace(b'\r\n', b'\n').replace(b'\r', b'\n').replace(b'\n', b'\r\n')
         
-        # 写回文件
-        with open(file_path, 'w', encoding='utf-8', newline='\r\n') as f:
+        # 目标可能是上次安装留下的指向源文件的硬链接，先删除再写入
+        if os.path.lexists(dst_path):
+            os.unlink(dst_path)
+        with open(dst_path, 'wb') as f:
             f.write(content)
         return True
     except Exception as e:
-        print(f"转换换行符失败: {file_path} - {str(e)}")
+        print(f"转换换行符失败: {dst_path} - {str(e)}")
         return False
 
-def process_markdown_files(directory):
-    """递归处理目录中的所有 Markdown 文件"""
-    success = True
-    if directory.exists():
-        print(f"处理 Markdown 文件: {directory}")
-        # 遍历目录中的所有文件
-        for root, _, files in os.walk(directory):
-            for file in files:
-                file_path = Path(root) / file
-                if file_path.suffix.lower() == '.md':  # 只处理 Markdown 文件
-                    if convert_line_endings(file_path):
-                        print(f"已转换: {file_path}")
-                    else:
-                        success = False
-    return success
+def _crlf_category(rel_dir, name):
+    """resource 中需要统一换行符的文件类别，其余文件返回 None"""
+    lower = name.lower()
+    if rel_dir[:1] == ("Announcement",) and lower.endswith('.md'):
+        return "markdown"
+    if rel_dir[:1] == ("pipeline",) and lower.endswith('.json'):
+        return "json"
+    if not rel_dir and name == "Changelog.md":
+        return "changelog"
+    return None
 
-def process_json_files(directory):
-    """递归处理目录中的所有 JSON 文件"""
+def _copy_resource_tree(src, dst):
+    """复制 resource 目录：普通文件直接链接或复制，需要转换换行符的文件收集后返回"""
+    pending = {"markdown": [], "json": [], "changelog": []}
+    stack = [(os.fspath(src), os.fspath(dst), ())]
+    while stack:
+        src_dir, dst_dir, rel_dir = stack.pop()
+        os.makedirs(dst_dir, exist_ok=True)
+        subdirs = []
+        with os.scandir(src_dir) as entries:
+            for entry in entries:
+                dst_path = os.path.join(dst_dir, entry.name)
+                if entry.is_dir():
+                    subdirs.append((entry.path, dst_path, rel_dir + (entry.name,)))
+                elif (category := _crlf_category(rel_dir, entry.name)):
+                    pending[category].append((entry.path, dst_path))
+                else:
+                    _link_or_copy(entry.path, dst_path)
+        # 倒序入栈，保证子目录按列出顺序深度优先处理（与 os.walk 一致）
+        stack.extend(reversed(subdirs))
+    return pending
+
+def convert_files(file_pairs):
+    """并发复制并转换一批 (源, 目标) 文件，按原顺序输出结果"""
+    if not file_pairs:
+        return True
     success = True
-    if directory.exists():
-        print(f"处理 JSON 文件: {directory}")
-        # 遍历目录中的所有文件
-        for root, _, files in os.walk(directory):
-            for file in files:
-                file_path = Path(root) / file
-                if file_path.suffix.lower() == '.json':  # 只处理 JSON 文件
-                    if convert_line_endings(file_path):
-                        print(f"已转换: {file_path}")
-                    else:
-                        success = False
+    max_workers = min(32, len(file_pairs), (os.cpu_count() or 1) * 4)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        # 分批提交，文件很多时不会一次创建全部 future
+        for start in range(0, len(file_pairs), _CONVERT_CHUNK_SIZE):
+            chunk = file_pairs[start:start + _CONVERT_CHUNK_SIZE]
+            results = executor.map(lambda pair: convert_line_endings(*pair), chunk)
+            for (_, dst_path), ok in zip(chunk, results):
+                if ok:
+                    print(f"已转换: {dst_path}")
+                else:
+                    success = False
     return success
 
+def _update_title(title):
+    """替换 custom_title 中 "MFABD2)" 后到 " | 游戏版本：" 前的所有内容为版本号"""
+    start = title.find("MFABD2)")
+    end = title.find("游戏版本：", start) if start != -1 else -1
+    if end != -1:
+        start += len("MFABD2)")
+        # 去掉 "游戏版本：" 前的 "空白|空白"，保留分隔符原样
+        head = title[start:end].rstrip()
+        if head.endswith("|"):
+            end = start + len(head[:-1].rstrip())
+            # 使用原始版本号，不修改格式
+            return title[:start] + f"{version} " + title[end:]
+    return title
+
+def _patch_interface_text(text):
+    """在原文中直接替换 version 和 custom_title 的值；键不存在或出现多次时返回 None"""
+    version_matches = list(_VERSION_VALUE_RE.finditer(text))
+    title_matches = list(_TITLE_VALUE_RE.finditer(text))
+    if len(version_matches) != 1 or len(title_matches) > 1:
+        return None
+    
+    # 1. 更新根版本字段（保持 CI 原始格式）
+    edits = [(version_matches[0].span(1), json.dumps(version, ensure_ascii=False))]
+    
+    # 2. 动态更新 custom_title 中的版本号
+    if title_matches:
+        match = title_matches[0]
+        title = _update_title(json.loads(match.group(1)))
+        edits.append((match.span(1), json.dumps(title, ensure_ascii=False)))
+    
+    # 从后往前替换，前面的位置不受影响
+    for (start, end), value in sorted(edits, reverse=True):
+        text = text[:start] + value + text[end:]
+    return text
+
+def _dump_interface(raw):
+    """解析 interface.json 更新版本信息后重新序列化"""
+    try:
+        # 不含注释时直接用标准库解析字节，省去解码和 jsonc 的注释与尾逗号预处理
+        interface = json.loads(raw)
+    except json.JSONDecodeError:
+        interface = jsonc.loads(raw.decode("utf-8"))
+    
+    # 1. 更新根版本字段（保持 CI 原始格式）
+    interface["version"] = version
+    
+    # 2. 动态更新 custom_title 中的版本号
+    if "custom_title" in interface:
+        interface["custom_title"] = _update_title(interface["custom_title"])
+    
+    # 换行符与文本模式写入时一致
+    return jsonc.dumps(interface, ensure_ascii=False, indent=4).replace("\n", os.linesep)
+
 def install_resource():
     configure_ocr_model()
 
-    # 复制整个 resource 目录
-    shutil.copytree(
+    # 复制整个 resource 目录，复制时一并转换 MD 和 JSON 文件的换行符
+    pending = _copy_resource_tree(
         working_dir / "assets" / "resource",
         install_path / "resource",
-        dirs_exist_ok=True,
     )
-    
-    # 分别处理 MD 和 JSON 文件换行符
     all_success = True
     
     # 1. 处理公告文件夹的 Markdown 文件
     announcement_dir = install_path / "resource" / "Announcement"
-    if not process_markdown_files(announcement_dir):
-        all_success = False
+    if announcement_dir.exists():
+        print(f"处理 Markdown 文件: {announcement_dir}")
+        if not convert_files(pending["markdown"]):
+            all_success = False
     
     # 2. 处理 pipeline 文件夹的 JSON 文件
     pipeline_dir = install_path / "resource" / "pipeline"
-    if not process_json_files(pipeline_dir):
-        all_success = False
+    if pipeline_dir.exists():
+        print(f"处理 JSON 文件: {pipeline_dir}")
+        if not convert_files(pending["json"]):
+            all_success = False
     
     # 3. 处理 Changelog.md 文件
     changelog_path = install_path / "resource" / "Changelog.md"
-    if changelog_path.exists():
+    if pending["changelog"]:
         print(f"处理更新日志文件: {changelog_path}")
-        if not convert_line_endings(changelog_path):
+        if not convert_line_endings(*pending["changelog"][0]):
             all_success = False
     else:
         print(f"注意: 未找到更新日志文件 {changelog_path}，跳过处理")
@@ -128,48 +276,43 @@ def install_resource():
     if not all_success:
         print("警告: 部分文件换行符转换失败")
 
-    # 复制并更新 interface.json
-    shutil.copy2(
-        working_dir / "assets" / "interface.json",
-        install_path,
-    )
-
-    with open(install_path / "interface.json", "r", encoding="utf-8") as f:
-        interface = jsonc.load(f)
+    # 读取源 interface.json，更新后一次写入安装目录
+    src_path = working_dir / "assets" / "interface.json"
+    dst_path = install_path / "interface.json"
+    with open(src_path, "rb") as f:
+        raw = f.read()
     
-    # 1. 更新根版本字段（保持 CI 原始格式）
-    interface["version"] = version
+    # 优先只改写 version 和 custom_title 两个值，保留原有格式；无法唯一定位时整体解析再序列化
+    new_raw = _patch_interface_text(raw.decode("utf-8"))
+    if new_raw is None:
+        new_raw = _dump_interface(raw)
+    new_raw = new_raw.encode("utf-8")
     
-    # 2. 动态更新 custom_title 中的版本号
-    if "custom_title" in interface:
-        # 匹配 "MFABD2)" 后到 " | 游戏版本" 前的所有内容
-        pattern = r"(?<=MFABD2\))(.*?)(?=\s*\|\s*游戏版本：)"
-        
-        # 使用原始版本号，不修改格式
-        display_version = f"{version} "
-        
-        # 执行替换
-        new_title = re.sub(
-            pattern, 
-            display_version,
-            interface["custom_title"]
-        )
-        interface["custom_title"] = new_title
-
-    with open(install_path / "interface.json", "w", encoding="utf-8") as f:
-        jsonc.dump(interface, f, ensure_ascii=False, indent=4)
+    if new_raw == raw:
+        _link_or_copy(src_path, dst_path)
+        return
+    
+    if os.path.lexists(dst_path):
+        # 上次安装的结果相同时不再写回
+        if not dst_path.is_symlink():
+            with open(dst_path, "rb") as f:
+                if f.read() == new_raw:
+                    return
+        # 目标可能是指向源文件的链接，先删除再写入
+        dst_path.unlink()
+    with open(dst_path, "wb") as f:
+        f.write(new_raw)
 
 def install_chores():
-    shutil.copy2(working_dir / "README.md", install_path)
-    shutil.copy2(working_dir / "LICENSE", install_path)
-    shutil.copy2(working_dir / "LICENSE-APACHE", install_path)
-    shutil.copy2(working_dir / "LICENSE-MIT", install_path)
+    for name in ("README.md", "LICENSE", "LICENSE-APACHE", "LICENSE-MIT"):
+        _link_or_copy(working_dir / name, install_path / name)
 
 def install_agent():
-    shutil.copytree(
+    # 字节码缓存由运行时重新生成，不随安装包分发
+    _fast_copytree(
         working_dir / "agent",
         install_path / "agent",
-        dirs_exist_ok=True,
+        ignore_globs=("__pycache__", "*.pyc", "*.pyo"),
     )
 
 if __name__ == "__main__":
@@ -6,14 +6,50 @@
 import os
 import sys
 import re
-from typing import List, Dict
+import logging
+from itertools import chain
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
 from version_logic import calculate_compare_base
-from git_operations import get_commit_list
 from version_rules import filter_valid_versions, sort_versions
 from history_manager import HistoryManager
 from version_analyzer import analyze_version_highlights
 from config import HISTORY_CONFIG, OUTPUT_CONFIG
-from git_operations import get_commit_list, get_merge_commits, get_released_branches_from_main, safe_get_commit_list, ensure_reference_exists, get_commit_timestamp
+from git_operations import get_commit_list, iter_merge_commits, get_released_branches_from_main, safe_get_commit_list, ensure_reference_exists, get_commit_timestamp
+
+# 运行参数：当前标签（环境变量）与测试模式（命令行参数）
+CURRENT_TAG = os.environ.get('CURRENT_TAG')
+TEST_MODE = len(sys.argv) > 1 and sys.argv[1] == "test"
+
+# 变更日志输出路径：仓库根目录下的 CHANGES.md
+OUTPUT_FILE = Path(__file__).resolve().parent.parent / "CHANGES.md"
+
+# 提交渲染相关配置（整个运行期间不变，逐个提交格式化时无需重复查表）
+_SHOW_BOT_ACCOUNTS = HISTORY_CONFIG['show_bot_accounts']
+_COAUTHOR_DISPLAY = HISTORY_CONFIG['coauthor_display']
+
+# 提交类型前缀（对小写后的标题匹配，与逐个 startswith 判断等价）
+_COMMIT_TYPE_RE = re.compile(r'(feat|fix|docs|style|refactor|test|chore|impr|perf|build|ci)')
+
+# 类型(作用域): 信息（支持中英文冒号），类型只接受全小写、首字母大写、全大写三种写法
+_CLEAN_PREFIX_RE = re.compile(
+    r'^(feat|fix|docs|style|refactor|test|chore|impr|perf|build|ci|revert'
+    r'|Feat|Fix|Docs|Style|Refactor|Test|Chore|Impr|Perf|Build|Ci|Revert'
+    r'|FEAT|FIX|DOCS|STYLE|REFACTOR|TEST|CHORE|IMPR|PERF|BUILD|CI|REVERT)(\(\w+\))?\s*[：:]\s*'
+)
+
+# 破坏性变更标记：BREAKING CHANGE / BREAKING-CHANGE，或首行含 "!:"
+_BREAKING_RE = re.compile(r'BREAKING[ -]CHANGE|^.*!:', re.IGNORECASE)
+
+# Co-authored-by 署名行
+_COAUTHOR_RE = re.compile(r'Co-authored-by:\s*([^<\n]+)(?:<[^>]+>)?', re.IGNORECASE | re.MULTILINE)
+
+# 合并提交标题：新格式 Merge:'分支'| 描述，以及 Git 默认格式
+_MERGE_NEW_RE = re.compile(r"^Merge:'([^']+)'\|\s*(.+)")
+_MERGE_OLD_RE = re.compile(r"Merge branch '([^']+)'")
+
+# Beta 预览中忽略的反向合并分支前缀
+_IGNORE_BRANCH_PREFIXES = ('main', 'master', 'develop', 'release')
 
 def group_commits_by_type(commits: List[Dict]) -> Dict[str, List[Dict]]:
     """按提交类型分组（简化版本，后续可以改进）"""
@@ -33,50 +69,16 @@ def group_commits_by_type(commits: List[Dict]) -> Dict[str, List[Dict]]:
     }
     
     for commit in commits:
-        subject = commit['subject'].lower()
-        
-        if subject.startswith('feat'):
-            groups['feat'].append(commit)
-        elif subject.startswith('fix'):
-            groups['fix'].append(commit)
-        elif subject.startswith('docs'):
-            groups['docs'].append(commit)
-        elif subject.startswith('style'):
-            groups['style'].append(commit)
-        elif subject.startswith('refactor'):
-            groups['refactor'].append(commit)
-        elif subject.startswith('test'):
-            groups['test'].append(commit)
-        elif subject.startswith('chore'):
-            groups['chore'].append(commit)
-        elif subject.startswith('impr'):
-            groups['impr'].append(commit)
-        elif subject.startswith('perf'):
-            groups['perf'].append(commit)
-        elif subject.startswith('build'):
-            groups['build'].append(commit)
-        elif subject.startswith('ci'):
-            groups['ci'].append(commit)
-        else:
-            groups['other'].append(commit)
+        # 一次前缀匹配取出类型，直接按类型定位分组
+        match = _COMMIT_TYPE_RE.match(commit['subject'].lower())
+        groups[match.group(1) if match else 'other'].append(commit)
     
     return groups
 
 def clean_commit_message(subject: str) -> str:
     """清理提交信息，移除类型前缀"""
-    # 匹配模式：类型(作用域): 信息（支持中英文冒号）
-    patterns = [
-        r'^(feat|fix|docs|style|refactor|test|chore|impr|perf|build|ci|revert)(\(\w+\))?\s*[：:]\s*',  # 中英文冒号
-        r'^(Feat|Fix|Docs|Style|Refactor|Test|Chore|Impr|Perf|Build|Ci|Revert)(\(\w+\))?\s*[：:]\s*',  # 首字母大写
-        r'^(FEAT|FIX|DOCS|STYLE|REFACTOR|TEST|CHORE|IMPR|PERF|BUILD|CI|REVERT)(\(\w+\))?\s*[：:]\s*',  # 全大写
-    ]
-    
-    for pattern in patterns:
-        cleaned = re.sub(pattern, '', subject)
-        if cleaned != subject:
-            return cleaned
-    
-    return subject
+    cleaned, count = _CLEAN_PREFIX_RE.subn('', subject, count=1)
+    return cleaned if count else subject
 
 def detect_commit_highlights(commit: Dict) -> Dict[str, bool]:
     """检测提交的特殊标记"""
@@ -84,21 +86,24 @@ def detect_commit_highlights(commit: Dict) -> Dict[str, bool]:
     subject = commit.get('subject', '')
     full_text = body + ' ' + subject
     
+    # 大多数提交既不含 "!:" 也不含 "BREAKING"，先用子串检查跳过正则
+    # （只查 "brea"：这几个字母在 IGNORECASE 下不会匹配任何非 ASCII 字符，结果与正则一致）
+    maybe_breaking = '!:' in full_text or 'brea' in full_text.lower()
+    
     return {
-        'is_breaking': any(re.search(pattern, full_text, re.IGNORECASE) 
-                          for pattern in [r'BREAKING CHANGE', r'BREAKING-CHANGE', r'^.*!:']),
-        'is_highlight': 'HIGHLIGHT:' in body.upper()
+        'is_breaking': maybe_breaking and bool(_BREAKING_RE.search(full_text)),
+        'is_highlight': bool(body) and ':' in body and 'HIGHLIGHT:' in body.upper()
     }
 
 def detect_coauthors(body: str) -> List[str]:
     """检测提交信息中的协作者"""
     coauthors = []
-    if not body:
+    # 正文不含署名行时跳过正则（这些字母在 IGNORECASE 下只匹配 ASCII，与小写子串检查等价）
+    if not body or 'co-authored-by:' not in body.lower():
         return coauthors
     
     # 匹配 Co-authored-by 格式
-    coauthor_pattern = r'Co-authored-by:\s*([^<\n]+)(?:<[^>]+>)?'
-    matches = re.findall(coauthor_pattern, body, re.IGNORECASE | re.MULTILINE)
+    matches = _COAUTHOR_RE.findall(body)
     
     for match in matches:
         coauthor_name = match.strip()
@@ -122,31 +127,29 @@ def format_commit_message(commit: Dict) -> str:
     highlight_marker = "💡 " if highlights['is_highlight'] else ""
 
     # 检测是否为机器人账号（根据配置决定是否显示）
-    is_bot = '[bot]' in author.lower()
-    if HISTORY_CONFIG['show_bot_accounts'] and is_bot:
+    # 先检查 '['，绝大多数非机器人作者名无需再生成小写副本
+    if _SHOW_BOT_ACCOUNTS and '[' in author and '[bot]' in author.lower():
         author_display = f"{author} 🤖"
     else:
         author_display = author
 
-    # 检测协作者信息
-    coauthors = detect_coauthors(body)
-    if coauthors and HISTORY_CONFIG['coauthor_display']:
-        coauthor_suffix = " " + " ".join(coauthors)
-        author_display += coauthor_suffix
+    # 检测协作者信息（未启用显示时无需扫描正文）
+    if _COAUTHOR_DISPLAY:
+        coauthors = detect_coauthors(body)
+        if coauthors:
+            author_display += " " + " ".join(coauthors)
 
     return f"- {breaking_marker}{highlight_marker}{cleaned_subject} @{author_display}"
 
 def parse_merge_subject(subject: str) -> tuple:
     """解析合并提交标题，返回 (分支名, 描述)"""
     # 1. 优先尝试新格式
-    pattern_new = r"^Merge:'([^']+)'\|\s*(.+)"
-    match = re.search(pattern_new, subject)
+    match = _MERGE_NEW_RE.search(subject)
     if match:
         return match.group(1), match.group(2).strip()
         
     # 2. 兼容 Git 默认格式 (防止旧合并丢失)
-    pattern_old = r"Merge branch '([^']+)'"
-    match = re.search(pattern_old, subject)
+    match = _MERGE_OLD_RE.search(subject)
     if match:
         branch_name = match.group(1)
         # 简单生成描述
@@ -155,7 +158,41 @@ def parse_merge_subject(subject: str) -> tuple:
         
     return None, None
 
-def get_beta_preview_content(compare_base: str, current_tag: str) -> str:
+def iter_active_features(merges: Iterable[Dict], base_ts: int, released_branches: Set[str]) -> Iterator[Tuple[str, str]]:
+    """从合并提交中逐个筛出仍在测试的功能分支，产出 (分支名, 描述)"""
+    seen = set()
+    for commit in merges:
+        # 【新增】时间过滤逻辑
+        # 如果该合并发生的时间 早于 正式版发布时间，说明它是“陈年旧账”，直接跳过
+        if base_ts > 0 and commit['timestamp'] < base_ts:
+            continue
+        
+        branch, desc = parse_merge_subject(commit['subject'])
+        if not branch:
+            continue
+        
+        # 过滤1: 忽略反向合并 (前缀匹配)
+        if branch.lower().startswith(_IGNORE_BRANCH_PREFIXES):
+            continue
+        # 过滤2: 已发布则跳过 (自动消失逻辑)
+        if branch in released_branches:
+            continue
+        # 过滤3: 只保留最新的 (去重逻辑)
+        if branch not in seen:
+            seen.add(branch)
+            yield branch, desc
+
+def get_version_type(tag: str) -> str:
+    """根据标签后缀判断版本类型"""
+    if '-beta' in tag:
+        return "公测版"
+    if '-alpha' in tag: # 修改点：新增内测版
+        return "内测版"
+    if '-ci' in tag:
+        return "开发版"
+    return "正式版"
+
+def get_beta_preview_content(compare_base: str, current_tag: str, is_beta_or_ci: Optional[bool] = None) -> str:
     """生成 Beta 功能预览板块"""
     # 标签不存在时的自动回退
     target_ref = current_tag
@@ -167,16 +204,18 @@ def get_beta_preview_content(compare_base: str, current_tag: str) -> str:
     base_ts = get_commit_timestamp(compare_base)
     print(f"时间过滤基准: {compare_base} (TS: {base_ts})")
     
-    # 获取区间内的合并提交
-    merges = get_merge_commits(compare_base, target_ref)
-    if not merges:
+    # 流式读取区间内的合并提交；一个都没有时无需扫描已发布分支
+    merges = iter_merge_commits(compare_base, target_ref)
+    first_merge = next(merges, None)
+    if first_merge is None:
         return ""
         
     # 获取 Main 分支已发布的功能黑名单
     # 如果是公测版/内测版/CI版 -> 过滤基准是 "main" (隐藏已正式发布的功能)
     # 如果是正式版     -> 过滤基准是 compare_base (隐藏上个版本以前的功能)
     # 修改点：加入 -alpha 判断
-    is_beta_or_ci = '-beta' in current_tag or '-ci' in current_tag or '-alpha' in current_tag
+    if is_beta_or_ci is None:
+        is_beta_or_ci = get_version_type(current_tag) != "正式版"
     
     if is_beta_or_ci:
         filter_ref = "main"
@@ -187,32 +226,8 @@ def get_beta_preview_content(compare_base: str, current_tag: str) -> str:
     print(f"Beta预览过滤基准: {filter_ref}")
     released_branches = get_released_branches_from_main(ref=filter_ref)
     
-    active_features = {} # {branch_name: description}
-    
-    # 定义反向合并的关键词前缀
-    IGNORE_PREFIXES = ['main', 'master', 'develop', 'release']
-
-    for commit in merges:
-        # 【新增】时间过滤逻辑
-        # 如果该合并发生的时间 早于 正式版发布时间，说明它是“陈年旧账”，直接跳过
-        if base_ts > 0 and commit['timestamp'] < base_ts:
-            # print(f"跳过旧合并: {commit['subject']} (早于基准)")
-            continue
-        
-        branch, desc = parse_merge_subject(commit['subject'])
-        
-        if branch:
-            branch_lower = branch.lower()
-            
-            # 过滤1: 忽略反向合并 (前缀匹配)
-            if any(branch_lower.startswith(prefix) for prefix in IGNORE_PREFIXES):
-                continue
-            # 过滤2: 已发布则跳过 (自动消失逻辑)
-            if branch in released_branches:
-                continue
-            # 过滤3: 只保留最新的 (去重逻辑)
-            if branch not in active_features:
-                active_features[branch] = desc
+    # {branch_name: description}
+    active_features = dict(iter_active_features(chain([first_merge], merges), base_ts, released_branches))
     
     if not active_features:
         return ""
@@ -266,14 +281,15 @@ def generate_changelog_content(commits: List[Dict], current_tag: str, compare_ba
     
     grouped_commits = group_commits_by_type(commits)
     
-    # 构建变更日志
-    changelog = f"# 更新日志\n\n"
-    changelog += f"## {current_tag}\n\n"
+    # 版本类型只判断一次，Beta 预览与构建信息共用
+    version_type = get_version_type(current_tag)
+    
+    # 构建变更日志（各段收集到列表中，最后一次拼接）
+    parts = [f"# 更新日志\n\n", f"## {current_tag}\n\n"]
     try:
-        changelog += get_beta_preview_content(compare_base, current_tag)
+        parts.append(get_beta_preview_content(compare_base, current_tag, is_beta_or_ci=version_type != "正式版"))
     except Exception as e:
         print(f"Beta预览生成忽略错误: {e}")
-    grouped_commits = group_commits_by_type(commits)
     # 定义分组标题
     group_titles = {
         'feat': '✨ 新功能',
@@ -300,39 +316,28 @@ def generate_changelog_content(commits: List[Dict], current_tag: str, compare_ba
             ]
             
             if filtered_commits:
-                changelog += f"### {title}\n\n"
-                for commit in filtered_commits:
-                    changelog += format_commit_message(commit) + "\n"
-            changelog += "\n"
+                parts.append(f"### {title}\n\n")
+                parts.extend(format_commit_message(commit) + "\n" for commit in filtered_commits)
+            parts.append("\n")
     
-    changelog += "[已有 Mirror酱 CDK？前往 Mirror酱 高速下载](https://mirrorchyan.com/zh/projects?rid=MFABD2)\n\n"
+    parts.append("[已有 Mirror酱 CDK？前往 Mirror酱 高速下载](https://mirrorchyan.com/zh/projects?rid=MFABD2)\n\n")
 
-    changelog += f"**对比范围**: {compare_base} → {current_tag}\n\n"
+    parts.append(f"**对比范围**: {compare_base} → {current_tag}\n\n")
 
     # 构建信息放在这里（历史版本前面）
-    changelog += "**构建信息**:\n"
-    
-    # 动态获取版本类型
-    if '-beta' in current_tag:
-        version_type = "公测版"
-    elif '-alpha' in current_tag: # 修改点：新增内测版
-        version_type = "内测版"
-    elif '-ci' in current_tag:
-        version_type = "开发版"
-    else:
-        version_type = "正式版"
+    parts.append("**构建信息**:\n")
     
-    changelog += f"- 版本: `{current_tag}`\n"
-    changelog += f"- 类型: {version_type}\n"
-    changelog += f"- 分支: {os.environ.get('GITHUB_REF_NAME', '未知')}\n"
+    parts.append(f"- 版本: `{current_tag}`\n")
+    parts.append(f"- 类型: {version_type}\n")
+    parts.append(f"- 分支: {os.environ.get('GITHUB_REF_NAME', '未知')}\n")
     
     # 使用当前时间作为构建时间
     from datetime import datetime
     build_time = datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ")
-    changelog += f"- 构建时间: {build_time}\n\n"
+    parts.append(f"- 构建时间: {build_time}\n\n")
 
 
-    return changelog
+    return "".join(parts)
 
 def add_historical_versions(current_changelog: str, current_tag: str) -> str:
     """添加历史版本折叠内容"""
@@ -361,8 +366,8 @@ def add_historical_versions(current_changelog: str, current_tag: str) -> str:
             print("没有找到相关历史版本")
             return current_changelog
         
-        # 构建历史版本折叠内容
-        historical_section = "\n## 历史版本更新内容\n\n"
+        # 构建历史版本折叠内容（各段收集到列表中，最后一次拼接）
+        parts = [current_changelog, "\n## 历史版本更新内容\n\n"]
         
         for release in historical_releases:
             tag = release['tag_name']
@@ -390,26 +395,18 @@ def add_historical_versions(current_changelog: str, current_tag: str) -> str:
                 print(f"跳过版本 {tag}: 内容为空")
                 continue
             
-            # 检查内容是否与其他版本重复
-            body_hash = hash(truncated_body.strip())
-            print(f"内容哈希: {body_hash}")
-            
-            historical_section += f"""<details>
-<summary>{tag} ({published_at}){marker_display}</summary>
-
-{truncated_body}
-
-</details>
-
-"""
+            parts.extend([
+                "<details>\n<summary>", tag, " (", published_at, ")", marker_display, "</summary>\n\n",
+                truncated_body, "\n\n</details>\n\n"
+            ])
         
         print(f"成功添加 {len(historical_releases)} 个历史版本")
         
         # 添加历史版本结束标识
         if historical_releases:
-            historical_section += "---\n*以上为历史版本信息*\n\n"
+            parts.append("---\n*以上为历史版本信息*\n\n")
         
-        return current_changelog + historical_section
+        return "".join(parts)
         
     except Exception as e:
         print(f"❌ 历史版本处理失败: {e}")
@@ -421,7 +418,7 @@ def main():
     print("=== 变更日志生成器 ===\n")
     
     # 获取当前标签（从环境变量或参数）
-    current_tag = os.environ.get('CURRENT_TAG')
+    current_tag = CURRENT_TAG
     if not current_tag:
         # 如果没有环境变量，使用测试标签
         current_tag = "v2.3.5"
@@ -436,7 +433,6 @@ def main():
     
     # 获取提交列表（使用安全版本）
     print("获取提交列表...")
-    from git_operations import safe_get_commit_list
     commits = safe_get_commit_list(compare_base, current_tag)
     print(f"获取到 {len(commits)} 个提交")
     
@@ -448,16 +444,16 @@ def main():
     print("添加历史版本...")
     changelog_content = add_historical_versions(changelog_content, current_tag)
     
-    # 输出到文件
-    output_file = "../CHANGES.md"
-    with open(output_file, 'w', encoding='utf-8') as f:
-        f.write(changelog_content)
+    # 输出到仓库根目录（按脚本位置定位，不依赖当前工作目录）
+    output_file = OUTPUT_FILE
+    output_file.write_text(changelog_content, encoding='utf-8')
     
     print(f"✅ 变更日志已生成: {output_file}")
     
     # 显示预览
     print("\n=== 变更日志预览 ===")
-    lines = changelog_content.split('\n')
+    # 只切出前20行，第21个元素存在即说明还有更多内容
+    lines = changelog_content.split('\n', 20)
     for line in lines[:20]:  # 显示前20行
         print(line)
     
@@ -485,8 +481,11 @@ def test_changelog_generator():
         print()
 
 if __name__ == "__main__":
+    # 设置 MFABD2_DEBUG 环境变量时输出各模块的诊断日志
+    if os.environ.get("MFABD2_DEBUG"):
+        logging.basicConfig(level=logging.DEBUG, format="%(message)s")
     # 测试模式
-    if len(sys.argv) > 1 and sys.argv[1] == "test":
+    if TEST_MODE:
         test_changelog_generator()
     else:
         # 正常模式
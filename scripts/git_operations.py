@@ -3,23 +3,60 @@
 Git操作模块 - 获取精确的提交列表（修复编码问题）
 """
 
+import atexit
+import logging
+import os
 import subprocess
 import re
-from typing import List, Dict, Optional
+import threading
+from functools import lru_cache
+from typing import List, Dict, Iterator, Optional
 from version_rules import filter_valid_versions, sort_versions
 import time
 
-def get_all_tags() -> list:
-    """获取所有Git标签"""
+# 诊断信息走 debug 日志（设置 MFABD2_DEBUG 环境变量后才输出），避免正常运行时刷屏
+logger = logging.getLogger(__name__)
+
+# 批量读取提交信息：配合 git log -z 以 NUL 分隔记录，US(0x1f) 分隔字段
+_FIELD_SEP = '\x1f'
+_COMMIT_RECORD_FORMAT = '%h%x1f%an%x1f%ae%x1f%ad%x1f%s%x1f%b'
+
+# 已发布分支识别规则，合并为一条正则，按优先级依次尝试：
+# 1. 自定义格式 (Merge:'xxx')
+# 2. 标准/中文 Git 格式 (带引号)
+# 3. GitHub PR 格式 (提取 from 后面部分)
+# 4. 无引号格式 (兜底)
+# 每个分支都锚定行首并用前瞻在整行中查找，因此结果与按顺序逐条 search 一致，
+# 不会因为靠前的低优先级格式而抢先匹配
+_RELEASED_BRANCH_RE = re.compile(
+    r"^(?:"
+    r"(?=.*?Merge:'(?P<custom>[^']+)')"
+    r"|(?=.*?(?:Merge branch|合并分支)\s*'(?P<quoted>[^']+)')"
+    r"|(?=.*?Merge pull request #[0-9]+ from (?P<pr>\S+))"
+    r"|(?=.*?(?:Merge branch|合并分支)\s+(?P<plain>\S+))"
+    r")",
+    re.DOTALL
+)
+
+def get_all_tags(include_ts: bool = False) -> list:
+    """获取所有Git标签（按创建时间从新到旧）；include_ts 为真时返回 (标签, Unix时间戳) 列表"""
     try:
+        # creatordate：附注标签取打标签时间，轻量标签取提交时间；lstrip=2 去掉 refs/tags/ 前缀
         result = subprocess.run(
-            ["git", "tag", "-l", "v*"],
+            ["git", "for-each-ref", "--sort=-creatordate",
+             "--format=%(refname:lstrip=2)%09%(creatordate:unix)", "refs/tags/v*"],
             capture_output=True, 
             text=True,
             check=True
         )
-        tags = [tag for tag in result.stdout.strip().split('\n') if tag]
-        return tags
+        entries = []
+        for line in result.stdout.split('\n'):
+            if line:
+                tag, _, ts = line.partition('\t')
+                entries.append((tag, int(ts) if ts.isdigit() else 0))
+        if include_ts:
+            return entries
+        return [tag for tag, _ in entries]
     except Exception as e:
         print(f"获取Git标签失败: {e}")
         return []
@@ -45,6 +82,92 @@ def run_git_command(args: List[str]) -> str:
                 print(f"错误信息: {e.stderr}")
         return ""
 
+def run_git_stream(args: List[str], sep: str = '\n') -> Iterator[str]:
+    """按分隔符（默认换行）流式读取Git命令输出（调用方提前停止迭代时终止子进程）"""
+    process = subprocess.Popen(
+        ["git"] + args,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+        encoding='utf-8',
+        errors='ignore'
+    )
+    finished = False
+    try:
+        if sep == '\n':
+            for line in process.stdout:
+                yield line.rstrip('\n')
+        else:
+            pending = ''
+            for chunk in iter(lambda: process.stdout.read(65536), ''):
+                records = (pending + chunk).split(sep)
+                pending = records.pop()
+                yield from records
+            if pending:
+                yield pending
+        finished = True
+    finally:
+        if not finished:
+            process.kill()
+        _, stderr = process.communicate()
+    if process.returncode:
+        print(f"Git命令失败: {' '.join(args)}")
+        print(f"错误码: {process.returncode}")
+        if stderr:
+            print(f"错误信息: {stderr}")
+
+class _CatFileSession:
+    """常驻的 git cat-file --batch 进程：逐行写入对象名、读取结果，查询无需每次启动 git"""
+
+    def __init__(self):
+        self._process = None
+        self._lock = threading.Lock()
+
+    def _start(self) -> subprocess.Popen:
+        if self._process is None or self._process.poll() is not None:
+            self._process = subprocess.Popen(
+                ["git", "cat-file", "--batch"],
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL
+            )
+        return self._process
+
+    def read_object(self, name: str) -> Optional[tuple]:
+        """返回 (对象类型, 内容字节)，对象不存在时返回 None；进程不可用时抛出 OSError"""
+        if '\n' in name:
+            raise OSError("对象名包含换行，无法逐行查询")
+        with self._lock:
+            process = self._start()
+            try:
+                process.stdin.write(name.encode('utf-8') + b'\n')
+                process.stdin.flush()
+                header = process.stdout.readline()
+                if not header:
+                    raise OSError("git cat-file 进程已退出")
+                # 找不到的对象输出 "<名称> missing"（或 ambiguous）
+                if header.endswith((b' missing\n', b' ambiguous\n')):
+                    return None
+                _, obj_type, size = header.split()
+                # 内容之后还有一个换行
+                content = process.stdout.read(int(size) + 1)[:-1]
+            except (OSError, ValueError):
+                self.close()
+                raise OSError("git cat-file 输出异常")
+            return obj_type.decode(), content
+
+    def close(self):
+        """结束常驻进程"""
+        if self._process is not None:
+            if self._process.poll() is None:
+                self._process.stdin.close()
+                self._process.wait()
+            self._process = None
+
+_cat_file = _CatFileSession()
+atexit.register(_cat_file.close)
+
+@lru_cache(maxsize=128)
 def get_commit_date(tag: str) -> Optional[str]:
     """获取标签的提交日期"""
     date_str = run_git_command(["log", "-1", "--format=format:%ai", tag])
@@ -52,11 +175,20 @@ def get_commit_date(tag: str) -> Optional[str]:
 
 def compare_tag_dates(tag1: str, tag2: str) -> int:
     """比较两个标签的时间顺序"""
-    date1 = get_commit_date(tag1)
-    date2 = get_commit_date(tag2)
+    # 一次 git log 取两个标签的日期（按参数顺序输出，指向同一提交时只输出一行）
+    dates = run_git_command(["log", "--no-walk=unsorted", "--format=format:%ai", tag1, tag2])
+    dates = dates.split('\n') if dates else []
+    if len(dates) == 2:
+        date1, date2 = dates
+    elif len(dates) == 1:
+        date1 = date2 = dates[0]
+    else:
+        # 有标签不存在时整条命令失败，逐个获取以确定哪个可用
+        date1 = get_commit_date(tag1)
+        date2 = get_commit_date(tag2)
     
-    print(f"标签 {tag1} 日期: {date1}")
-    print(f"标签 {tag2} 日期: {date2}")
+    logger.debug("标签 %s 日期: %s", tag1, date1)
+    logger.debug("标签 %s 日期: %s", tag2, date2)
     
     if date1 and date2:
         return -1 if date1 < date2 else (1 if date1 > date2 else 0)
@@ -67,10 +199,10 @@ def compare_tag_dates(tag1: str, tag2: str) -> int:
 def get_simple_commit_list(from_ref: str, to_ref: str) -> List[Dict]:
     """获取简化的提交列表（更稳定的方法）"""
     
-    print(f"尝试获取提交: {from_ref}..{to_ref}")
+    logger.debug("尝试获取提交: %s..%s", from_ref, to_ref)
     
     # 方法1: 使用简单的oneline格式
-    log_output = run_git_command([
+    lines = run_git_stream([
         "log", 
         f"{from_ref}..{to_ref}",
         "--oneline",
@@ -78,7 +210,7 @@ def get_simple_commit_list(from_ref: str, to_ref: str) -> List[Dict]:
     ])
     
     commits = []
-    for line in log_output.split('\n'):
+    for line in lines:
         if line.strip():
             # 解析格式: "哈希 提交信息"
             parts = line.split(' ', 1)
@@ -95,28 +227,11 @@ def get_simple_commit_list(from_ref: str, to_ref: str) -> List[Dict]:
     
     return commits
 
-def get_detailed_commit_info(commit_hash: str) -> Dict:
-    """获取单个提交的详细信息"""
-    author = run_git_command(["log", "-1", "--format=format:%an", commit_hash])
-    email = run_git_command(["log", "-1", "--format=format:%ae", commit_hash])
-    date = run_git_command(["log", "-1", "--format=format:%ad", commit_hash])
-    subject = run_git_command(["log", "-1", "--format=format:%s", commit_hash])
-    body = run_git_command(["log", "-1", "--format=format:%b", commit_hash])
-    
-    return {
-        'hash': commit_hash,
-        'author_name': author if author else '未知',
-        'author_email': email if email else '',
-        'date': date if date else '',
-        'subject': subject if subject else '',
-        'body': body if body else ""
-    }
-
 def get_commit_list(from_ref: str, to_ref: str) -> List[Dict]:
     """获取两个引用之间的提交列表（稳定版本）"""
     
     # 首先检查时间顺序
-    print("检查标签时间顺序...")
+    logger.debug("检查标签时间顺序...")
     date_comparison = compare_tag_dates(from_ref, to_ref)
     
     if date_comparison > 0:
@@ -128,18 +243,32 @@ def get_commit_list(from_ref: str, to_ref: str) -> List[Dict]:
         actual_from = from_ref
         actual_to = to_ref
     
-    print(f"最终对比范围: {actual_from}..{actual_to}")
+    logger.debug("最终对比范围: %s..%s", actual_from, actual_to)
     
-    # 先获取简化的提交列表
-    simple_commits = get_simple_commit_list(actual_from, actual_to)
-    print(f"找到 {len(simple_commits)} 个提交")
+    # 一次 git log 取回全部字段，避免逐个提交再调用 git
+    logger.debug("尝试获取提交: %s..%s", actual_from, actual_to)
+    records = run_git_stream([
+        "log",
+        f"{actual_from}..{actual_to}",
+        "--no-merges",
+        "-z",
+        f"--format={_COMMIT_RECORD_FORMAT}"
+    ], sep='\0')
     
-    # 然后为每个提交获取详细信息
     detailed_commits = []
-    for i, simple_commit in enumerate(simple_commits):
-        # print(f"获取提交详情 {i+1}/{len(simple_commits)}: {simple_commit['hash'][:8]}") # 注释掉避免刷屏
-        detailed_commit = get_detailed_commit_info(simple_commit['hash'])
-        detailed_commits.append(detailed_commit)
+    for record in records:
+        fields = [field.strip() for field in record.split(_FIELD_SEP, 5)]
+        fields += [''] * (6 - len(fields))
+        commit_hash, author, email, date, subject, body = fields
+        detailed_commits.append({
+            'hash': commit_hash,
+            'author_name': author if author else '未知',
+            'author_email': email,
+            'date': date,
+            'subject': subject,
+            'body': body
+        })
+    print(f"找到 {len(detailed_commits)} 个提交")
     
     return detailed_commits
 
@@ -175,16 +304,32 @@ def test_git_operations_simple():
 
 # 注意：这里原文件有两个 get_all_tags，我把重复的去掉了
 
+# 引用是否存在的查询结果缓存 {ref: bool}
+_ref_exists_cache: Dict[str, bool] = {}
+
+def verify_references(refs: List[str]) -> Dict[str, bool]:
+    """批量验证多个引用是否存在（经常驻 cat-file 进程查询，结果会缓存）"""
+    for ref in dict.fromkeys(refs):
+        if ref in _ref_exists_cache:
+            continue
+        try:
+            _ref_exists_cache[ref] = _cat_file.read_object(ref) is not None
+        except OSError:
+            # 常驻进程不可用时退回 rev-parse 逐个验证
+            _ref_exists_cache[ref] = bool(run_git_command(["rev-parse", "--verify", ref]))
+    return {ref: _ref_exists_cache[ref] for ref in refs}
+
 def ensure_reference_exists(ref: str) -> bool:
     """确保Git引用存在"""
-    result = run_git_command(["rev-parse", "--verify", ref])
-    return bool(result)
+    return verify_references([ref])[ref]
 
 def resolve_branch_reference(ref: str) -> str:
     """
     【新增】智能解析分支引用
     优先查找本地分支，如果不存在则查找远程分支（适配CI环境）
     """
+    # 本地与远程两个候选一次查询
+    verify_references([ref, f"origin/{ref}"])
     if ensure_reference_exists(ref):
         return ref
     
@@ -199,7 +344,8 @@ def resolve_branch_reference(ref: str) -> str:
 def safe_get_commit_list(from_ref: str, to_ref: str) -> List[Dict]:
     """安全的提交列表获取（处理引用不存在的情况）"""
     
-    # 确保引用存在
+    # 确保引用存在（两个引用一次查询）
+    verify_references([from_ref, to_ref])
     if not ensure_reference_exists(from_ref):
         print(f"警告: 引用 {from_ref} 不存在，尝试使用默认基准")
         # 尝试使用最新的正式版作为基准
@@ -241,97 +387,110 @@ def test_safe_operations():
     print(f"安全操作提交数量: {len(commits)}")
 
 
+@lru_cache(maxsize=128)
 def get_commit_timestamp(ref: str) -> int:
     """获取提交的Committer Unix时间戳"""
+    # 优先从常驻 cat-file 进程读取提交对象的 committer 行（"committer 名字 <邮箱> 时间戳 时区"）
+    try:
+        obj = _cat_file.read_object(f"{ref}^{{commit}}")
+    except OSError:
+        obj = None
+    if obj is not None:
+        for line in obj[1].split(b'\n'):
+            if not line:
+                break  # 提交头结束
+            if line.startswith(b'committer '):
+                fields = line.rsplit(b' ', 2)
+                if len(fields) == 3 and fields[1].isdigit():
+                    return int(fields[1])
+                break
+    # 引用不存在或解析失败时按原方式查询（保留原有的错误输出）
     ts = run_git_command(["log", "-1", "--format=%ct", ref])
     return int(ts) if ts and ts.strip().isdigit() else 0
 
-# 【修改函数】获取合并提交列表 (增加时间戳返回)
-def get_merge_commits(from_ref: str, to_ref: str) -> List[Dict]:
-    """
-    获取合并提交列表，包含时间戳
-    """
-    # 使用自定义格式输出: hash | timestamp | subject
+def invalidate_git_caches() -> None:
+    """清空按引用缓存的查询结果（仓库引用发生变化后调用）"""
+    _ref_exists_cache.clear()
+    _cat_file.close()
+    get_commit_date.cache_clear()
+    get_commit_timestamp.cache_clear()
+
+def iter_merge_commits(from_ref: str, to_ref: str) -> Iterator[Dict]:
+    """流式逐个产出合并提交（含时间戳），边读取 git 输出边解析"""
+    # 使用自定义格式输出: hash US timestamp US subject，记录以 NUL 分隔
     # %ct 是提交人的Unix时间戳
-    log_output = run_git_command([
+    records = run_git_stream([
         "log", 
         f"{from_ref}..{to_ref}",
-        "--format=%h|%ct|%s",
+        "-z",
+        f"--format=%h{_FIELD_SEP}%ct{_FIELD_SEP}%s",
         "--merges",
         "--topo-order"
-    ])
+    ], sep='\0')
     
-    commits = []
-    for line in log_output.split('\n'):
-        if line.strip():
-            parts = line.split('|', 2)
-            if len(parts) == 3:
-                commits.append({
-                    'hash': parts[0],
-                    'timestamp': int(parts[1]),
-                    'subject': parts[2]
-                })
-    return commits
+    for record in records:
+        parts = record.split(_FIELD_SEP, 2)
+        if len(parts) == 3:
+            yield {
+                'hash': parts[0],
+                'timestamp': int(parts[1]),
+                'subject': parts[2]
+            }
+
+# 【修改函数】获取合并提交列表 (增加时间戳返回)
+def get_merge_commits(from_ref: str, to_ref: str) -> List[Dict]:
+    """
+    获取合并提交列表，包含时间戳
+    """
+    return list(iter_merge_commits(from_ref, to_ref))
 
 # 【修改函数】包含之前的正则终极修复
-def get_released_branches_from_main(ref: str = "main", limit: int = 2000) -> set:
+def get_released_branches_from_main(ref: str = "main", limit: int = 2000, since: Optional[str] = None) -> set:
     """
     扫描指定引用(ref)的合并记录，提取已发布的分支名
     修复：全面覆盖 GitHub PR、同仓库合并、中文客户端及自定义格式
+    since: 可选的起始时间（git --since 格式，如 "@<unix时间戳>"），给定时 git 扫描到更早的提交即停止
     """
     target_ref = resolve_branch_reference(ref)
-    print(f"正在扫描 {target_ref} 的已发布分支...")
+    logger.debug("正在扫描 %s 的已发布分支...", target_ref)
     
-    log_output = run_git_command([
+    # 规则只关心提交标题，直接取 %s 并以 NUL 分隔，省去哈希前缀
+    args = [
         "log",
         target_ref,
         "-n", str(limit),
-        "--oneline",
-        "--merges"
-    ])
+        "--merges",
+        "-z",
+        "--format=%s"
+    ]
+    if since:
+        args.append(f"--since={since}")
+    subjects = run_git_stream(args, sep='\0')
     
     released = set()
-    
-    # 1. 自定义格式 (Merge:'xxx')
-    pattern_custom = r"Merge:'([^']+)'"
-    # 2. 标准/中文 Git 格式 (带引号)
-    pattern_git_quoted = r"(?:Merge branch|合并分支)\s*'([^']+)'"
-    # 3. GitHub PR 格式 (提取 from 后面部分)
-    pattern_pr = r"Merge pull request #[0-9]+ from (\S+)"
-    # 4. 无引号格式 (兜底)
-    pattern_git_plain = r"(?:Merge branch|合并分支)\s+(\S+)"
-
-    for line in log_output.split('\n'):
-        # 依次尝试匹配
-        match = re.search(pattern_custom, line)
-        if match:
-            released.add(match.group(1))
-            continue
-            
-        match = re.search(pattern_git_quoted, line)
-        if match:
-            released.add(match.group(1))
-            continue
-            
-        match = re.search(pattern_pr, line)
-        if match:
-            full_ref = match.group(1)
-            released.add(full_ref)
-            if '/' in full_ref: # 尝试剥离用户名 fix/branch
-                parts = full_ref.split('/', 1)
-                if len(parts) > 1: released.add(parts[1])
-            continue
 
-        match = re.search(pattern_git_plain, line)
-        if match:
-            candidate = match.group(1)
-            if candidate.lower() not in ['into', 'from']:
+    for subject in subjects:
+        match = _RELEASED_BRANCH_RE.match(subject)
+        if not match:
+            continue
+        kind = match.lastgroup
+        candidate = match.group(kind)
+        if kind == 'pr':
+            released.add(candidate)
+            if '/' in candidate: # 尝试剥离用户名 fix/branch
+                released.add(candidate.split('/', 1)[1])
+        elif kind == 'plain':
+            if candidate.lower() not in ('into', 'from'):
                 released.add(candidate)
+        else:
+            released.add(candidate)
             
     print(f"共发现 {len(released)} 个已发布分支")
     return released
 
 if __name__ == "__main__":
+    if os.environ.get("MFABD2_DEBUG"):
+        logging.basicConfig(level=logging.DEBUG, format="%(message)s")
     # print("=== Git操作模块测试 ===") # 保持原样
     test_git_operations_simple()
     test_specific_range()
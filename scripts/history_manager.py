@@ -6,9 +6,45 @@
 import os
 import re
 import sys
+import json
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from concurrent.futures import ThreadPoolExecutor
+from operator import itemgetter
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
 from typing import List, Dict, Optional
-from version_rules import filter_valid_versions, sort_versions, is_valid_formal_version
+from config import GITHUB_CONFIG
+from version_rules import parse_version_tuple, filter_valid_versions, sort_versions, is_valid_formal_version
+
+# 有 orjson 时用它解析 API 响应（C 实现，大体积 release 正文解析更快），否则使用标准库
+try:
+    from orjson import loads as _json_loads
+except ImportError:
+    _json_loads = json.loads
+
+# 并发获取 releases 分页的最大线程数（连接池大小与之一致）
+_MAX_FETCH_WORKERS = 6
+
+# releases 分页的 ETag 缓存文件（跨运行复用，内容未变化的页面无需重新传输）
+_RELEASES_CACHE_FILE = Path.home() / ".cache" / "mfabd2" / "releases.json"
+
+# GraphQL 只查询生成历史版本所需的字段（REST 接口会返回 assets/author 等大量无用数据）
+_RELEASES_QUERY = """
+query($owner: String!, $name: String!, $cursor: String) {
+  repository(owner: $owner, name: $name) {
+    releases(first: 100, after: $cursor, orderBy: {field: CREATED_AT, direction: DESC}) {
+      nodes { tagName isPrerelease publishedAt description }
+      pageInfo { hasNextPage endCursor }
+    }
+  }
+}
+"""
+
+# Release 正文中的 CDK 链接（用户内容结束标志），按优先级排列
+_CDK_LINK_RE = re.compile(r'\[已有 Mirror酱 CDK[^\]]*\]\([^)]+\)')
+_CDK_LINK_SHORT_RE = re.compile(r'\[Mirror酱 CDK[^\]]*\]\([^)]+\)')
 
 class HistoryManager:
     def __init__(self, github_token: str, repo_owner: str, repo_name: str):
@@ -21,47 +57,143 @@ class HistoryManager:
             "Accept": "application/vnd.github.v3+json",
             "User-Agent": "MFABD2-History-Manager"
         }
+        # 所有 API 请求共用一个会话，复用 keep-alive 连接，避免每页重新握手
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        # 网关类错误（502/503/504）自动退避重试，连接池容纳所有并发分页请求
+        retry = Retry(
+            total=GITHUB_CONFIG['max_retries'],
+            backoff_factor=0.5,
+            status_forcelist=[502, 503, 504],
+            raise_on_status=False
+        )
+        self.session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=_MAX_FETCH_WORKERS, max_retries=retry))
+        # fetch_all_releases 的结果（同一实例只请求一次）
+        self._all_releases: Optional[List[Dict]] = None
 
     def parse_version(self, tag: str) -> tuple:
         """解析版本号，带错误处理（支持公测版/开发版）"""
         try:
             # 提取基础版本号部分
             # v2.3.7-beta.251112.cf64235 → v2.3.7 → (2, 3, 7)
-            base_tag = re.sub(r'(-beta\.\d+\.[a-f0-9]+|-ci\.\d+\.[a-f0-9]+)$', '', tag)
-            clean_tag = base_tag.lstrip('v')
-            parts = clean_tag.split('.')
-            if len(parts) != 3:
+            version = parse_version_tuple(tag) if tag.startswith('v') else ()
+            if len(version) != 3:
                 raise ValueError(f"版本格式异常: {tag}")
-            return tuple(int(part) for part in parts)
+            return version
         except Exception as e:
             print(f"❌ 版本解析失败: {tag} - {e}")
             sys.exit(1)
     
+    def load_releases_cache(self) -> Dict:
+        """读取 releases 分页的 ETag 缓存"""
+        try:
+            with open(_RELEASES_CACHE_FILE, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+    
+    def save_releases_cache(self, cache: Dict):
+        """保存 releases 分页的 ETag 缓存（失败不影响作业）"""
+        try:
+            _RELEASES_CACHE_FILE.parent.mkdir(parents=True, exist_ok=True)
+            with open(_RELEASES_CACHE_FILE, 'w', encoding='utf-8') as f:
+                json.dump(cache, f, ensure_ascii=False)
+        except OSError as e:
+            print(f"警告: 保存Releases缓存失败: {e}")
+    
+    def fetch_releases_graphql(self) -> Optional[List[Dict]]:
+        """通过 GraphQL 按游标分页获取所有releases，只传输需要的字段；失败时返回 None"""
+        print("通过GraphQL获取GitHub Releases...")
+        variables = {"owner": self.repo_owner, "name": self.repo_name, "cursor": None}
+        releases = []
+        
+        while True:
+            try:
+                response = self.session.post("https://api.github.com/graphql",
+                                             json={"query": _RELEASES_QUERY, "variables": variables},
+                                             timeout=GITHUB_CONFIG['timeout'])
+                data = _json_loads(response.content) if response.status_code == 200 else {}
+            except Exception as e:
+                print(f"GraphQL查询失败: {e}")
+                return None
+            if not data.get("data") or data.get("errors"):
+                print(f"GraphQL查询失败: {response.status_code} - {response.text}")
+                return None
+            
+            connection = data["data"]["repository"]["releases"]
+            # 转换为 REST 接口的字段名，后续处理无需区分来源
+            releases.extend({
+                'tag_name': node['tagName'],
+                'prerelease': node['isPrerelease'],
+                'published_at': node['publishedAt'],
+                'body': node['description'],
+            } for node in connection["nodes"])
+            
+            if not connection["pageInfo"]["hasNextPage"]:
+                break
+            variables["cursor"] = connection["pageInfo"]["endCursor"]
+        
+        return releases
+    
     def fetch_all_releases(self) -> List[Dict]:
-        """获取所有releases，失败则终止作业"""
+        """获取所有releases（优先 GraphQL，失败时回退到 REST 分页），失败则终止作业"""
+        if self._all_releases is not None:
+            return self._all_releases
+        
+        releases = self.fetch_releases_graphql()
+        if releases is not None:
+            print(f"成功获取 {len(releases)} 个releases")
+            self._all_releases = releases
+            return releases
+        
         print("获取GitHub Releases...")
         url = f"{self.base_url}/releases"
-        releases = []
-        page = 1
+        cache = self.load_releases_cache()
+        
+        def fetch_page(page: int) -> tuple:
+            """返回 (该页 releases, 末页链接)；未变化的页面由缓存提供"""
+            page_url = f"{url}?page={page}&per_page=100"
+            cached = cache.get(page_url)
+            # 条件请求：页面未变化时返回 304，直接使用缓存内容
+            headers = {"If-None-Match": cached["etag"]} if cached else {}
+            response = self.session.get(page_url, headers=headers, timeout=GITHUB_CONFIG['timeout'])
+            last_url = response.links.get("last", {}).get("url", "")
+            if response.status_code == 304 and cached:
+                return cached["releases"], last_url or cached.get("last", "")
+            if response.status_code != 200:
+                raise Exception(f"API请求失败: {response.status_code} - {response.text}")
+            page_releases = _json_loads(response.content)
+            if response.headers.get("ETag"):
+                cache[page_url] = {"etag": response.headers["ETag"], "releases": page_releases, "last": last_url}
+            return page_releases, last_url
         
         try:
-            while True:
-                response = requests.get(f"{url}?page={page}&per_page=100", headers=self.headers, timeout=30)
-                if response.status_code != 200:
-                    raise Exception(f"API请求失败: {response.status_code} - {response.text}")
-                
-                page_releases = response.json()
+            first_page, last_url = fetch_page(1)
+            pages = [first_page]
+            
+            # 通过 Link 头中的 rel="last" 得知总页数，其余页面并发获取
+            last_page = int(parse_qs(urlparse(last_url).query).get("page", ["1"])[0]) if first_page else 1
+            last_page = min(last_page, 10)  # 安全限制
+            if last_page > 1:
+                with ThreadPoolExecutor(max_workers=min(last_page - 1, _MAX_FETCH_WORKERS)) as executor:
+                    futures = [executor.submit(fetch_page, page) for page in range(2, last_page + 1)]
+                    try:
+                        # 按页码顺序收集，任一页失败（如 403 速率限制）即取消尚未开始的请求
+                        pages.extend(future.result()[0] for future in futures)
+                    finally:
+                        executor.shutdown(cancel_futures=True)
+            
+            releases = []
+            for page, page_releases in enumerate(pages, 1):
                 if not page_releases:
                     break
-                    
                 releases.extend(page_releases)
-                page += 1
-                
-                if page > 10:  # 安全限制
+                if page == 10:
                     print("警告: 达到页面限制，停止获取更多releases")
-                    break
             
+            self.save_releases_cache(cache)
             print(f"成功获取 {len(releases)} 个releases")
+            self._all_releases = releases
             return releases
             
         except Exception as e:
@@ -72,51 +204,59 @@ class HistoryManager:
         print(f"保留所有 {len(releases)} 个版本（去重逻辑已禁用）")
         return releases
 
+    def parse_formal_releases(self, releases: List[Dict]) -> List[tuple]:
+        """筛选正式版并解析版本号（每个标签只解析一次），返回 (版本号, release) 列表"""
+        parsed = []
+        for release in releases:
+            tag = release['tag_name']
+            if not is_valid_formal_version(tag):
+                continue
+            try:
+                parsed.append((self.parse_version(tag), release))
+            except SystemExit:
+                # 跳过解析失败的版本
+                print(f"跳过解析失败版本: {tag}")
+        return parsed
+
     def get_minor_version_series(self, current_tag: str) -> List[Dict]:
         """获取同次版本的所有正式版Release"""
+        formal_releases = None
         try:
             current_major, current_minor, _ = self.parse_version(current_tag)
             print(f"当前版本: v{current_major}.{current_minor}.x 系列")
         except SystemExit:
             # 如果版本解析失败（比如当前是公测版），使用最新正式版作为基准
             print(f"当前标签 {current_tag} 不是正式版，使用最新正式版作为历史基准")
-            all_releases = self.fetch_all_releases()
-            formal_releases = [r for r in all_releases if is_valid_formal_version(r['tag_name'])]
+            formal_releases = self.parse_formal_releases(self.fetch_all_releases())
             if formal_releases:
-                latest_formal = max(formal_releases, key=lambda r: self.parse_version(r['tag_name']))
-                current_major, current_minor, _ = self.parse_version(latest_formal['tag_name'])
+                current_major, current_minor, _ = max(version for version, _ in formal_releases)
                 print(f"使用基准版本: v{current_major}.{current_minor}.x 系列")
             else:
                 print("没有找到任何正式版，跳过历史版本")
                 return []
         
-        all_releases = self.fetch_all_releases()
+        # Releases 只获取一次，基准推断与筛选共用
+        if formal_releases is None:
+            formal_releases = self.parse_formal_releases(self.fetch_all_releases())
         
-        relevant_releases = []
-        for release in all_releases:
+        relevant = []
+        for version, release in formal_releases:
             tag = release['tag_name']
-            if not is_valid_formal_version(tag):
-                continue
-                
-            try:
-                major, minor, _ = self.parse_version(tag)
-                # 只包含完全相同的次版本，不包含更早的
-                if major == current_major and minor == current_minor:
-                    # 排除当前版本自身（如果是正式版）
-                    if tag != current_tag:
-                        relevant_releases.append(release)
-                        print(f"包含历史版本: {tag}")
-                    else:
-                        print(f"排除当前版本: {tag}")
+            major, minor, _ = version
+            # 只包含完全相同的次版本，不包含更早的
+            if major == current_major and minor == current_minor:
+                # 排除当前版本自身（如果是正式版）
+                if tag != current_tag:
+                    relevant.append((version, release))
+                    print(f"包含历史版本: {tag}")
                 else:
-                    print(f"跳过不同次版本: {tag} (当前: v{current_major}.{current_minor}.x)")
-            except SystemExit:
-                # 跳过解析失败的版本
-                print(f"跳过解析失败版本: {tag}")
-                continue
+                    print(f"排除当前版本: {tag}")
+            else:
+                print(f"跳过不同次版本: {tag} (当前: v{current_major}.{current_minor}.x)")
         
-        # 按版本号排序（从新到旧）
-        relevant_releases.sort(key=lambda r: self.parse_version(r['tag_name']), reverse=True)
+        # 按版本号排序（从新到旧），直接使用已解析的版本号
+        relevant.sort(key=itemgetter(0), reverse=True)
+        relevant_releases = [release for _, release in relevant]
         
         # 移除重复内容
         relevant_releases = self.remove_duplicate_releases(relevant_releases)
@@ -132,22 +272,19 @@ class HistoryManager:
         body = body.strip()
         
         # 第一优先级：CDK链接（用户内容结束标志）
-        cdk_patterns = [
-            r'\[已有 Mirror酱 CDK[^\]]*\]\([^)]+\)',
-            r'\[Mirror酱 CDK[^\]]*\]\([^)]+\)',
-        ]
-        
-        for pattern in cdk_patterns:
-            cdk_match = re.search(pattern, body)
-            if cdk_match:
-                truncated = body[:cdk_match.start()].strip()
-                print(f"使用CDK链接截断，长度: {len(truncated)}")
-                return truncated
-        
-        # 第二优先级：构建信息（自动化内容开始）
-        build_info_match = re.search(r'\*\*构建信息\*\*:', body)
-        if build_info_match:
-            truncated = body[:build_info_match.start()].strip()
+        # 两种写法都含 "Mirror酱 CDK"，不含该子串的正文无需运行正则
+        if 'Mirror酱 CDK' in body:
+            for pattern in (_CDK_LINK_RE, _CDK_LINK_SHORT_RE):
+                cdk_match = pattern.search(body)
+                if cdk_match:
+                    truncated = body[:cdk_match.start()].strip()
+                    print(f"使用CDK链接截断，长度: {len(truncated)}")
+                    return truncated
+        
+        # 第二优先级：构建信息（自动化内容开始），固定文本直接查找
+        build_info_pos = body.find('**构建信息**:')
+        if build_info_pos != -1:
+            truncated = body[:build_info_pos].strip()
             print(f"使用构建信息截断，长度: {len(truncated)}")
             return truncated
         
@@ -165,21 +302,25 @@ class HistoryManager:
     
     def remove_duplicate_cdk_links(self, body: str) -> str:
         """移除重复的CDK链接，只保留一个"""
-        cdk_pattern = r'\[已有 Mirror酱 CDK[^\]]*\]\([^)]+\)'
-        cdk_matches = list(re.finditer(cdk_pattern, body))
+        cdk_matches = list(_CDK_LINK_RE.finditer(body))
         
         if len(cdk_matches) <= 1:
             return body
         
-        # 保留最后一个CDK链接
-        last_cdk = cdk_matches[-1]
-        result = body[:last_cdk.start()] + body[last_cdk.start():last_cdk.end()]
+        # 保留最后一个CDK链接：删去之前的各个链接，其余正文原样保留
+        pieces = []
+        prev_end = 0
+        for cdk_match in cdk_matches[:-1]:
+            pieces.append(body[prev_end:cdk_match.start()])
+            prev_end = cdk_match.end()
+        pieces.append(body[prev_end:])
         
-        return result.strip()
+        return "".join(pieces).strip()
     
     def smart_length_truncate(self, body: str, max_lines: int = 50) -> str:
         """智能长度截断"""
-        lines = body.split('\n')
+        # 只需要前 max_lines + 1 行，其余部分不拆分（超长正文无需构建完整行列表）
+        lines = body.split('\n', max_lines + 1)
         if len(lines) <= max_lines:
             return body
         
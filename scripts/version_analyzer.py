@@ -6,6 +6,10 @@
 import re
 from typing import Dict, List
 
+# 破坏性变更/亮点功能标记，合并为单个忽略大小写的正则，一次扫描完成检测
+_BREAKING_RE = re.compile(r'⚠️|破坏性变更|BREAKING CHANGE|BREAKING-CHANGE', re.IGNORECASE)
+_HIGHLIGHT_RE = re.compile(r'💡|HIGHLIGHT|重要更新|亮点功能|重大更新', re.IGNORECASE)
+
 def analyze_version_highlights(release: Dict) -> str:
     """分析版本的亮点标记"""
     body = release.get('body', '')
@@ -23,16 +27,14 @@ def contains_breaking_change(text: str) -> bool:
     if not text:
         return False
         
-    patterns = [r'⚠️', r'破坏性变更', r'BREAKING CHANGE', r'BREAKING-CHANGE']
-    return any(re.search(pattern, text, re.IGNORECASE) for pattern in patterns)
+    return bool(_BREAKING_RE.search(text))
 
 def contains_highlight_feature(text: str) -> bool:
     """检测是否包含亮点功能"""
     if not text:
         return False
         
-    patterns = [r'💡', r'HIGHLIGHT', r'重要更新', r'亮点功能', r'重大更新']
-    return any(re.search(pattern, text, re.IGNORECASE) for pattern in patterns)
+    return bool(_HIGHLIGHT_RE.search(text))
 
 def test_analyzer():
     """测试分析器"""
@@ -3,12 +3,17 @@
 版本对比逻辑 - 决定跟哪个版本对比
 """
 
-import re
+from bisect import bisect_left
+from functools import lru_cache
 from typing import Optional, List
-from version_rules import filter_valid_versions, sort_versions, is_valid_formal_version, is_valid_beta_version, is_valid_alpha_version, is_valid_ci_version
+from version_rules import PRERELEASE_SUFFIX_RE, parse_version_tuple, filter_valid_versions, sort_versions, is_valid_formal_version, is_valid_beta_version, is_valid_alpha_version, is_valid_ci_version
 
+# 主分支名称（比较时忽略大小写）
+_MAIN_BRANCHES = frozenset(("main", "master"))
+
+@lru_cache(maxsize=1)
 def get_all_tags() -> List[str]:
-    """获取所有Git标签"""
+    """获取所有Git标签（一次运行内标签不变，结果缓存，各查找函数共用）"""
     import subprocess
     try:
         result = subprocess.run(
@@ -23,8 +28,9 @@ def get_all_tags() -> List[str]:
         print(f"获取Git标签失败: {e}")
         return []
 
+@lru_cache(maxsize=1)
 def get_current_branch() -> str:
-    """获取当前分支名称"""
+    """获取当前分支名称（结果缓存）"""
     import subprocess
     try:
         result = subprocess.run(
@@ -41,8 +47,7 @@ def get_current_branch() -> str:
 
 def is_main_branch(branch_name: str) -> bool:
     """判断是否为主分支"""
-    main_branches = ["main", "master", "Main", "Master"]
-    return branch_name in main_branches
+    return branch_name.lower() in _MAIN_BRANCHES
 
 def find_previous_formal_release(current_tag: str) -> Optional[str]:
     """查找上一个正式版"""
@@ -56,30 +61,24 @@ def find_previous_formal_release(current_tag: str) -> Optional[str]:
         return None
     
     # 清理当前标签，获取基础版本号
-    current_clean = re.sub(r'(-beta\.\d+\.[a-f0-9]+|-ci\.\d+\.[a-f0-9]+)$', '', current_tag)
+    current_clean = PRERELEASE_SUFFIX_RE.sub('', current_tag)
     
     # 找到当前标签在正式版列表中的位置
-    for i, formal_tag in enumerate(formal_versions):
-        if formal_tag == current_clean:
-            # 如果是正式版，找上一个
-            if i + 1 < len(formal_versions):
-                return formal_versions[i + 1]
-            else:
-                return None
+    if current_clean in formal_versions:
+        # 如果是正式版，找上一个
+        i = formal_versions.index(current_clean)
+        if i + 1 < len(formal_versions):
+            return formal_versions[i + 1]
+        else:
+            return None
     
     # 如果当前标签不是正式版，找比它小的最新正式版
-    # 使用版本号比较而不是字符串比较
-    def parse_simple_version(tag):
-        """简单版本解析用于比较"""
-        base_tag = re.sub(r'(-beta\.\d+\.[a-f0-9]+|-alpha\.\d+\.[a-f0-9]+|-ci\.\d+\.[a-f0-9]+)$', '', tag)
-        numbers = base_tag[1:].split('.')
-        return tuple(int(num) for num in numbers)
-    
-    current_version = parse_simple_version(current_clean)
-    for formal_tag in formal_versions:
-        formal_version = parse_simple_version(formal_tag)
-        if formal_version < current_version:
-            return formal_tag
+    # 使用版本号比较而不是字符串比较：列表从新到旧，反转后二分查找
+    current_version = parse_version_tuple(current_clean)
+    ascending_keys = [parse_version_tuple(tag) for tag in reversed(formal_versions)]
+    smaller_count = bisect_left(ascending_keys, current_version)
+    if smaller_count:
+        return formal_versions[len(formal_versions) - smaller_count]
     
     return None
 
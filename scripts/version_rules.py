@@ -4,13 +4,38 @@
 """
 
 import re
-from typing import List, Dict  # ✅ 确保有这些导入
+from functools import lru_cache
+from typing import List, Dict, Tuple  # ✅ 确保有这些导入
 
+# 各类版本标签的严格模式（模块加载时编译一次）
+_FORMAL_RE = re.compile(r'^v\d+\.\d+\.\d+$')
+_ALPHA_RE = re.compile(r'^v\d+\.\d+\.\d+-alpha\.\d{6}\.[a-f0-9]{7,}$')
+_BETA_RE = re.compile(r'^v\d+\.\d+\.\d+-beta\.\d{6}\.[a-f0-9]{7,}$')
+_CI_RE = re.compile(r'^v\d+\.\d+\.\d+-ci\.\d{6}\.[a-f0-9]{7,}$')
 
+# 单次匹配完成分类，命中的分组名即版本类型（与上面四个模式等价）
+_CLASSIFY_RE = re.compile(
+    r'^(?P<formal>v\d+\.\d+\.\d+)$'
+    r'|^(?P<beta>v\d+\.\d+\.\d+-beta\.\d{6}\.[a-f0-9]{7,})$'
+    r'|^(?P<alpha>v\d+\.\d+\.\d+-alpha\.\d{6}\.[a-f0-9]{7,})$'
+    r'|^(?P<ci>v\d+\.\d+\.\d+-ci\.\d{6}\.[a-f0-9]{7,})$'
+)
+
+# 公测版/内测版/开发版标签后缀：v2.3.7-beta.251112.cf64235 → v2.3.7（供各模块共用）
+PRERELEASE_SUFFIX_RE = re.compile(r'(?:-beta\.\d+\.[a-f0-9]+|-alpha\.\d+\.[a-f0-9]+|-ci\.\d+\.[a-f0-9]+)$')
+
+@lru_cache(maxsize=4096)
+def parse_version_tuple(tag: str) -> Tuple[int, ...]:
+    """解析标签的基础版本号：v2.3.7-beta.251112.cf64235 → (2, 3, 7)，格式异常时抛出 ValueError"""
+    # 后缀均以'-'开头，正式版标签无需运行正则
+    base_tag = PRERELEASE_SUFFIX_RE.sub('', tag) if '-' in tag else tag
+    return tuple(map(int, base_tag[1:].split('.')))  # 去掉'v'，按.分割
+
+@lru_cache(maxsize=4096)
 def is_valid_formal_version(tag: str) -> bool:
     """判断是否为有效的正式版 - 严格模式"""
     # 严格的正式版模式：v数字.数字.数字，从v2.0.0开始
-    if not re.match(r'^v\d+\.\d+\.\d+$', tag):
+    if not _FORMAL_RE.match(tag):
         return False
     
     # 只接受v2.0.0及以上的正式版，忽略所有v0.x.x和v1.x.x
@@ -19,23 +44,23 @@ def is_valid_formal_version(tag: str) -> bool:
         
     return True
 
+@lru_cache(maxsize=4096)
 def is_valid_alpha_version(tag: str) -> bool:
     """判断是否为有效的内测版 - 严格模式"""
     # 必须符合: v数字.数字.数字-alpha.6位日期.7位以上哈希
-    pattern = r'^v\d+\.\d+\.\d+-alpha\.\d{6}\.[a-f0-9]{7,}$'
-    return bool(re.match(pattern, tag))
+    return bool(_ALPHA_RE.match(tag))
 
+@lru_cache(maxsize=4096)
 def is_valid_beta_version(tag: str) -> bool:
     """判断是否为有效的公测版 - 严格模式"""
     # 必须符合: v数字.数字.数字-beta.6位日期.7位以上哈希
-    pattern = r'^v\d+\.\d+\.\d+-beta\.\d{6}\.[a-f0-9]{7,}$'
-    return bool(re.match(pattern, tag))
+    return bool(_BETA_RE.match(tag))
 
+@lru_cache(maxsize=4096)
 def is_valid_ci_version(tag: str) -> bool:
     """判断是否为有效的开发版 - 严格模式"""
     # 必须符合: v数字.数字.数字-ci.6位日期.7位以上哈希
-    pattern = r'^v\d+\.\d+\.\d+-ci\.\d{6}\.[a-f0-9]{7,}$'
-    return bool(re.match(pattern, tag))
+    return bool(_CI_RE.match(tag))
 
 def is_nested_version(tag: str) -> bool:
     """检测是否为嵌套版本（需要排除的错误版本）"""
@@ -62,17 +87,12 @@ def filter_valid_versions(tags: List[str]) -> Dict[str, List[str]]:
             result['nested'].append(tag)
             continue
             
-        # 然后检查其他有效版本
-        if is_valid_formal_version(tag):
-            result['formal'].append(tag)
-        elif is_valid_beta_version(tag):
-            result['beta'].append(tag)
-        elif is_valid_alpha_version(tag):
-            result['alpha'].append(tag)
-        elif is_valid_ci_version(tag):
-            result['ci'].append(tag)
-        else:
+        # 然后一次匹配确定版本类型（正式版只接受v2.0.0及以上）
+        match = _CLASSIFY_RE.match(tag)
+        if not match or (match.lastgroup == 'formal' and tag.startswith(('v0.', 'v1.'))):
             result['invalid'].append(tag)
+        else:
+            result[match.lastgroup].append(tag)
     
     return result
 
@@ -81,12 +101,10 @@ def sort_versions(versions: List[str]) -> List[str]:
     def version_key(tag):
         # 提取版本号部分进行排序（支持公测版/开发版）
         try:
-            base_tag = re.sub(r'(-beta\.\d+\.[a-f0-9]+|-alpha\.\d+\.[a-f0-9]+|-ci\.\d+\.[a-f0-9]+)$', '', tag)
-            numbers = base_tag[1:].split('.')  # 去掉'v'，按.分割
-            return [int(num) for num in numbers]
+            return parse_version_tuple(tag)
         except Exception as e:
             print(f"版本排序警告: {tag} - {e}")
-            return [0, 0, 0]  # 返回默认值避免崩溃
+            return (0, 0, 0)  # 返回默认值避免崩溃
     
     return sorted(versions, key=version_key, reverse=True)
 